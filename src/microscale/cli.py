@@ -2,51 +2,163 @@ from __future__ import annotations
 
 import argparse
 import logging
+import sys
 from multiprocessing import Pool
 from pathlib import Path
 
+from .extract import extract, load_rois
 from .model import Ops
 from .pipeline import process_image
+from .preflight import preflight
+from .workqueue import WorkQueue, run_queue
 
 
-def parse_args() -> argparse.Namespace:
-    p = argparse.ArgumentParser(prog="microscale")
-    p.add_argument("files", nargs="+", type=Path)
+COMMANDS = ("run", "check", "extract")
+
+
+def _add_common_args(p: argparse.ArgumentParser) -> None:
     p.add_argument("--noiptc", action="store_true")
+    p.add_argument("-j", "--jobs", type=int, default=0)
+    p.add_argument("-v", "--verbose", action="count", default=0)
+
+
+def _add_ops_args(p: argparse.ArgumentParser) -> None:
+    p.add_argument("files", nargs="+", type=Path)
     p.add_argument("--crop", action="store_true")
     p.add_argument("--rotate", action="store_true")
     p.add_argument("--scale", action="store_true")
     p.add_argument("--descale", action="store_true")
-    p.add_argument("-j", "--jobs", type=int, default=0)
-    p.add_argument("-v", "--verbose", action="count", default=0)
+    p.add_argument(
+        "--rescale",
+        action="store_true",
+        help="replace the existing scale bar in place (one lossless pass)",
+    )
+    p.add_argument(
+        "--variant",
+        action="append",
+        default=[],
+        metavar="OPS[:TAG]",
+        help="extra output from the same read, e.g. 'descale' or 'descale,rotate,scale:r'",
+    )
+    _add_common_args(p)
 
-    return p.parse_args()
 
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    """Parse arguments; without a subcommand, 'run' is assumed."""
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] not in (*COMMANDS, "-h", "--help"):
+        argv = ["run", *argv]
 
-def main() -> None:
-    args = parse_args()
+    p = argparse.ArgumentParser(prog="microscale")
+    sub = p.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="process files (default when no command is given)")
+    _add_ops_args(run)
+    run.add_argument("--preflight", action="store_true", help="validate all files first")
+    run.add_argument("--queue", type=Path, help="shared queue directory for multi-host runs")
+    run.add_argument("--node", help="node name in the shared queue (default: hostname)")
+    run.add_argument(
+        "--queue-root",
+        type=Path,
+        help="share root that file keys are relative to (default: parent of --queue)",
+    )
+
+    check = sub.add_parser("check", help="validate files against the operations only")
+    _add_ops_args(check)
 
+    extract_p = sub.add_parser("extract", help="cut ROIs listed in CSV/JSON files")
+    extract_p.add_argument("rois", nargs="+", type=Path, help="CSV/JSON lists of rectangles")
+    extract_p.add_argument(
+        "-o", "--out", type=Path, help="output directory (default: next to source)"
+    )
+    _add_common_args(extract_p)
+
+    return p.parse_args(argv)
+
+
+def parse_variant(spec: str, noiptc: bool = False) -> Ops:
+    """Parse a --variant spec: comma-separated operations, optionally ':tag'."""
+    names, _, tag = spec.partition(":")
+    flags = {name.strip() for name in names.split(",") if name.strip()}
+
+    unknown = flags - {"descale", "crop", "rotate", "scale", "rescale"}
+    if unknown:
+        raise ValueError(f"Unknown variant operation(s): {', '.join(sorted(unknown))}")
+
+    return Ops(
+        noiptc=noiptc,
+        descale="descale" in flags,
+        crop="crop" in flags,
+        rotate="rotate" in flags,
+        scale="scale" in flags,
+        rescale="rescale" in flags,
+        tag=tag,
+    )
+
+
+def setup_logging(verbose: int) -> None:
     logging.basicConfig(
-        level=logging.WARNING - 10 * args.verbose,
+        level=logging.WARNING - 10 * verbose,
         format="%(levelname)s %(message)s",
     )
 
+
+def extract_files(args: argparse.Namespace) -> None:
+    """microscale extract: cut ROIs listed in CSV/JSON files out of their images."""
+    if args.out:
+        args.out.mkdir(parents=True, exist_ok=True)
+
+    for roi_file in args.rois:
+        for fp, rois in load_rois(roi_file).items():
+            extract(fp, rois, args.out, noiptc=args.noiptc, jobs=args.jobs)
+
+
+def main() -> None:
+    args = parse_args()
+    setup_logging(args.verbose)
+
+    if args.command == "extract":
+        extract_files(args)
+        return
+
     ops = Ops(
         noiptc=args.noiptc,
         descale=args.descale,
         crop=args.crop,
         rotate=args.rotate,
         scale=args.scale,
+        rescale=args.rescale,
+        variants=tuple(parse_variant(spec, noiptc=args.noiptc) for spec in args.variant),
     )
 
     if args.descale and args.crop:
         raise ValueError("Cannot use both --descale and --crop")
+    if args.rescale and (args.descale or args.crop or args.rotate or args.scale):
+        raise ValueError("--rescale replaces --descale --scale and cannot be combined")
+
+    # Probed sizes travel with each job, so they also reach spawned workers
+    sizes: dict[Path, tuple[int, int]] = {}
+    if args.command == "check" or args.preflight:
+        probes, problems = preflight(args.files, ops, jobs=args.jobs)
+        sizes = {fp: p.size for fp, p in probes.items()}
+        for problem in problems:
+            logging.error("%s", problem)
+        if problems:
+            raise SystemExit(1)
+        if args.command == "check":
+            return
+
+    if args.queue:
+        node = {"node": args.node} if args.node else {}
+        queue = WorkQueue(args.queue, share_root=args.queue_root, **node)
+        run_queue(queue, args.files, ops, jobs=args.jobs, sizes=sizes)
+        return
 
-    jobs = [(fp, ops) for fp in args.files]
+    jobs = [(fp, ops, sizes.get(fp)) for fp in args.files]
 
     if args.jobs > 1:
         with Pool(args.jobs) as pool:
             pool.starmap(process_image, jobs)
     else:
-        for fp, ops in jobs:
-            process_image(fp, ops)
+        for fp, ops, size in jobs:
+            process_image(fp, ops, size)
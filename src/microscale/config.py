@@ -3,6 +3,7 @@ TARGET_RATIO = 1.164  # width / height
 SCALE_HEIGHT = 48  # pixels to remove from bottom if too tall
 CROPPED_SUFFIX = "#"  # suffix for cropped files
 SCALED_SUFFIX = "_"  # suffix for scaled files
+ROI_SUFFIX = "-roi"  # suffix for extracted regions of interest
 PIX_PER_MM = {
     "n1": 426,
     "n2": 683,
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import csv
+import json
+import logging
+import os
+import re
+from collections.abc import Sequence
+from multiprocessing.pool import ThreadPool
+from pathlib import Path
+
+from .config import ROI_SUFFIX
+from .model import Roi
+from .ops import metadata
+from .ops.jpegtran import transform_bytes
+from .preflight import probe
+
+logger = logging.getLogger(__name__)
+
+BAND_RATIO = 0.5  # pre-crop to the union of all ROIs when it is smaller than this
+ROI_NAME = re.compile(r"[A-Za-z0-9][A-Za-z0-9._-]*")  # names become part of file names
+
+
+def _check_name(name: str) -> str:
+    if name and not ROI_NAME.fullmatch(name):
+        raise ValueError(f"ROI name {name!r} does not match {ROI_NAME.pattern}")
+    return name
+
+
+def load_rois(fp: Path) -> dict[Path, list[Roi]]:
+    """
+    Read rectangles per image from CSV or JSON.
+
+    CSV needs a header ``image,x,y,width,height[,name]``; JSON is a list of
+    objects with the same keys. Image paths are relative to the list file.
+    Names become part of file names and must match ROI_NAME.
+    """
+    if fp.suffix.lower() == ".json":
+        rows = json.loads(fp.read_text())
+    else:
+        with fp.open(newline="") as f:
+            rows = list(csv.DictReader(f))
+
+    rois: dict[Path, list[Roi]] = {}
+    for i, row in enumerate(rows, start=1):
+        try:
+            roi = Roi(
+                x=int(row["x"]),
+                y=int(row["y"]),
+                width=int(row["width"]),
+                height=int(row["height"]),
+                name=_check_name(str(row.get("name") or "")),
+            )
+            image = fp.parent / row["image"]
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"{fp.name}: invalid ROI #{i}: {e!r}") from None
+        rois.setdefault(image, []).append(roi)
+
+    return rois
+
+
+def snap(roi: Roi, size: tuple[int, int], imcu: tuple[int, int]) -> Roi:
+    """
+    Grow roi outwards to iMCU boundaries so it can be cut losslessly.
+
+    The right/bottom edges are clamped to the image, where partial iMCUs are allowed.
+    """
+    w, h = size
+    bw, bh = imcu
+    if roi.width <= 0 or roi.height <= 0 or not (0 <= roi.x < w and 0 <= roi.y < h):
+        raise ValueError(f"ROI {roi} is empty or outside the {w}x{h} image")
+
+    x0 = roi.x - roi.x % bw
+    y0 = roi.y - roi.y % bh
+    x1 = min(w, -(-(roi.x + roi.width) // bw) * bw)
+    y1 = min(h, -(-(roi.y + roi.height) // bh) * bh)
+    return Roi(x0, y0, x1 - x0, y1 - y0, roi.name)
+
+
+def _union(rois: Sequence[Roi]) -> Roi:
+    x0 = min(r.x for r in rois)
+    y0 = min(r.y for r in rois)
+    x1 = max(r.x + r.width for r in rois)
+    y1 = max(r.y + r.height for r in rois)
+    return Roi(x0, y0, x1 - x0, y1 - y0)
+
+
+def _geometry(roi: Roi) -> str:
+    return f"{roi.width}x{roi.height}+{roi.x}+{roi.y}"
+
+
+def extract(
+    fp: Path,
+    rois: Sequence[Roi],
+    out_dir: Path | None = None,
+    *,
+    noiptc: bool = False,
+    jobs: int = 0,
+) -> list[Path]:
+    """
+    Losslessly cut many regions of interest out of one JPEG.
+
+    The source is read and its metadata captured once; ROIs are snapped to
+    iMCU boundaries and cut with jpegtran from memory, in parallel. When the
+    ROIs cover a small part of the image they are first cut together as one
+    band, so each ROI crop only re-parses that band. jobs is the number of
+    cutting threads, 0 for one per CPU.
+
+    Returns:
+        Paths of the extracted files, in the order of rois.
+    """
+    out_dir = fp.parent if out_dir is None else out_dir
+    for r in rois:
+        _check_name(r.name)
+    orig_stat = fp.stat()
+
+    p = probe(fp)
+    snapped = [snap(r, p.size, p.imcu) for r in rois]
+    data = fp.read_bytes()
+
+    meta = None
+    if not noiptc:
+        try:
+            meta = metadata.capture(fp, want_thumbnail=False)  # crops are reframed
+        except Exception as e:
+            logger.warning("Failed to copy metadata: %s", e)
+
+    band = _union(snapped)
+    if len(snapped) > 1 and band.width * band.height < BAND_RATIO * p.size[0] * p.size[1]:
+        data = transform_bytes(data, ["-crop", _geometry(band)])
+        snapped = [
+            Roi(r.x - band.x, r.y - band.y, r.width, r.height, r.name) for r in snapped
+        ]
+        logger.debug("%s: ROIs pre-cut to band %s", fp.name, _geometry(band))
+
+    outputs = [
+        out_dir / f"{fp.stem}{ROI_SUFFIX}-{r.name or f'{i:03d}'}{fp.suffix}"
+        for i, r in enumerate(snapped, start=1)
+    ]
+    if len(set(outputs)) != len(outputs):
+        raise ValueError(f"{fp.name}: ROI names are not unique")
+
+    def cut(roi: Roi, fp_out: Path) -> Path:
+        fp_out.write_bytes(transform_bytes(data, ["-crop", _geometry(roi)]))
+        if meta is not None:
+            metadata.apply(meta, fp_out)
+        os.utime(fp_out, (orig_stat.st_atime, orig_stat.st_mtime))
+        return fp_out
+
+    with ThreadPool(jobs or os.cpu_count()) as pool:
+        pool.starmap(cut, zip(snapped, outputs))
+
+    logger.info("%s: %d ROIs extracted", fp.name, len(outputs))
+    return outputs
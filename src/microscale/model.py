@@ -11,9 +11,21 @@ class Ops:
     descale: bool = False
     rotate: bool = False
     scale: bool = True
+    rescale: bool = False  # replace the existing scale bar in place (implies scale)
+    tag: str = ""  # appended to the output stem, tells fan-out variants apart
+    variants: tuple[Ops, ...] = ()  # extra outputs produced from the same read
 
 
 @dataclass(frozen=True)
 class Job:
     path: Path
     ops: Ops
+
+
+@dataclass(frozen=True)
+class Roi:
+    x: int
+    y: int
+    width: int
+    height: int
+    name: str = ""
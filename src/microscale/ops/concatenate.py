@@ -10,7 +10,7 @@ from PIL import Image
 
 from .jpegtran import run_jpegtran
 
-MetadataOption = Literal["all", "exif", "iptc", "none"]
+MetadataOption = Literal["all", "comments", "exif", "iptc", "none"]
 
 
 def enlarge_with_jpegtran(
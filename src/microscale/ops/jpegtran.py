@@ -18,6 +18,14 @@ class JpegtranError(Exception):
     """Raised when jpegtran fails."""
 
 
+def image_size(fp: Path, size: tuple[int, int] | None = None) -> tuple[int, int]:
+    """Return (width, height) of fp: size when already known (e.g. probed), else its header."""
+    if size is not None:
+        return size
+    with Image.open(fp) as im:
+        return im.size
+
+
 def run_jpegtran(args: list[str]) -> None:
     """Run jpegtran and raise a clean, informative error on failure."""
     try:
@@ -27,7 +35,17 @@ def run_jpegtran(args: list[str]) -> None:
         raise JpegtranError(msg) from None
 
 
-def _round_down_block(x: int, block: int = JPEG_BLOCK) -> int:
+def transform_bytes(data: bytes, args: list[str]) -> bytes:
+    """Run jpegtran on in-memory JPEG data (stdin -> stdout) and return the result."""
+    try:
+        res = subprocess.run([JPEGTRAN_BIN, *args], input=data, check=True, capture_output=True)
+    except subprocess.CalledProcessError as e:
+        msg = e.stderr.decode(errors="replace").strip() if e.stderr else ""
+        raise JpegtranError(msg or "jpegtran failed with no stderr") from None
+    return res.stdout
+
+
+def round_down_block(x: int, block: int = JPEG_BLOCK) -> int:
     """Round down x to nearest multiple of block (jpegtran requirement)."""
     return x - (x % block)
 
@@ -39,36 +57,48 @@ def _crop_geometry(w: int, h: int, target_ratio: float) -> str:
     Width is reduced to match target_ratio; height unchanged.
     Geometry is centered horizontally and block-aligned.
     """
-    crop_w = _round_down_block(int(h * target_ratio))
-    crop_h = _round_down_block(h)
+    crop_w = round_down_block(int(h * target_ratio))
+    crop_h = round_down_block(h)
     left = (w - crop_w) // 2
     return f"{crop_w}x{crop_h}+{left}+0"
 
 
-def descale(fp: Path, fp_out: Path, scale_height: int = SCALE_HEIGHT) -> Path:
+def descale(
+    fp: Path,
+    fp_out: Path,
+    scale_height: int = SCALE_HEIGHT,
+    size: tuple[int, int] | None = None,
+) -> Path:
     """
     Lossless removal of scale bar from the bottom of a JPEG.
+
+    size: (width, height) of fp if already known, to skip reading its header.
     """
-    with Image.open(fp) as im:
-        w, h = im.size
+    w, h = image_size(fp, size)
 
     new_h = h - scale_height
     if new_h <= 0:
         raise ValueError(f"{fp.name}: scale height ({scale_height}) exceeds image height ({h})")
 
-    crop_h = _round_down_block(new_h)
+    crop_h = round_down_block(new_h)
     crop_str = f"{w}x{crop_h}+0+0"
     run_jpegtran(["-crop", crop_str, "-outfile", str(fp_out), str(fp)])
     logger.info("%s: Descale done -> %s", fp.name, fp_out.name)
     return fp_out
 
 
-def crop(fp: Path, fp_out: Path, target_ratio: float = TARGET_RATIO) -> Path:
+def crop(
+    fp: Path,
+    fp_out: Path,
+    target_ratio: float = TARGET_RATIO,
+    size: tuple[int, int] | None = None,
+) -> Path:
     """
     Lossless crop to target aspect ratio by trimming left/right sides.
+
+    size: (width, height) of fp if already known, to skip reading its header.
     """
-    with Image.open(fp) as im:
-        w, h = im.size
+    w, h = image_size(fp, size)
 
     current_ratio = w / h
     if current_ratio <= target_ratio:
@@ -2,10 +2,15 @@ from __future__ import annotations
 
 import io
 import logging
+import struct
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Any
 
 import pyexiv2  # type: ignore
-from PIL import Image
+from PIL import Image, JpegImagePlugin
+
+from .jpegtran import JPEG_BLOCK, JpegtranError, transform_bytes
 
 logger = logging.getLogger(__name__)
 
@@ -15,40 +20,249 @@ THUMB_TAGS = {
     "Exif.Thumbnail.JPEGInterchangeFormatLength",
 }
 
+EXIF_HEADER = b"Exif\x00\x00"
+TAG_THUMB_OFFSET = 0x0201
+TAG_THUMB_LENGTH = 0x0202
+THUMB_SNAP_TOLERANCE = 0.02  # max misframing of a reused thumbnail, fraction of its size
+
+
+def _read_exif_segment(fp: Path) -> bytes | None:
+    """Return the TIFF payload of the first Exif APP1 segment, without reading image data."""
+    with fp.open("rb") as f:
+        if f.read(2) != b"\xff\xd8":
+            return None
+        while True:
+            marker = f.read(2)
+            if len(marker) < 2 or marker[0] != 0xFF or marker[1] in (0xD9, 0xDA):
+                return None  # EOI / SOS: no more header segments
+            size = f.read(2)
+            if len(size) < 2:
+                return None
+            seg_len = int.from_bytes(size, "big") - 2
+            if marker[1] == 0xE1:
+                data = f.read(seg_len)
+                if data.startswith(EXIF_HEADER):
+                    return data[len(EXIF_HEADER) :]
+            else:
+                f.seek(seg_len, 1)
+
+
+def _ifd1_thumbnail_tags(tiff: bytes) -> tuple[int, int] | None:
+    """Read (offset, length) of the thumbnail from IFD1 of a TIFF block."""
+    order = {b"II": "<", b"MM": ">"}.get(tiff[:2])
+    if order is None:
+        return None
+
+    try:
+        ifd0 = struct.unpack_from(order + "I", tiff, 4)[0]
+        count = struct.unpack_from(order + "H", tiff, ifd0)[0]
+        ifd1 = struct.unpack_from(order + "I", tiff, ifd0 + 2 + 12 * count)[0]
+        if ifd1 == 0:
+            return None
+
+        tags: dict[int, int] = {}
+        count = struct.unpack_from(order + "H", tiff, ifd1)[0]
+        for i in range(count):
+            pos = ifd1 + 2 + 12 * i
+            tag, typ = struct.unpack_from(order + "HH", tiff, pos)
+            fmt = "H" if typ == 3 else "I"  # SHORT or LONG, both inline
+            tags[tag] = struct.unpack_from(order + fmt, tiff, pos + 8)[0]
+    except struct.error:
+        return None
+
+    if TAG_THUMB_OFFSET not in tags or TAG_THUMB_LENGTH not in tags:
+        return None
+    return tags[TAG_THUMB_OFFSET], tags[TAG_THUMB_LENGTH]
+
+
+def read_valid_thumbnail(fp: Path) -> bytes | None:
+    """
+    Return the embedded EXIF thumbnail of fp if it is intact, else None.
+
+    The thumbnail offset/length must lie inside the APP1 segment and the
+    data must be a complete JPEG that Pillow can decode.
+    """
+    tiff = _read_exif_segment(fp)
+    if tiff is None or len(tiff) < 8:
+        return None
+
+    tags = _ifd1_thumbnail_tags(tiff)
+    if tags is None:
+        return None
+    offset, length = tags
+    if length == 0 or offset + length > len(tiff):
+        logger.debug("%s: thumbnail exceeds APP1 segment", fp.name)
+        return None
+
+    thumb = tiff[offset : offset + length]
+    if not thumb.startswith(b"\xff\xd8") or not thumb.rstrip(b"\x00").endswith(b"\xff\xd9"):
+        return None
+
+    try:
+        with Image.open(io.BytesIO(thumb)) as im:
+            if im.format != "JPEG":
+                return None
+            im.load()
+    except (OSError, SyntaxError, ValueError):
+        logger.debug("%s: thumbnail does not decode", fp.name)
+        return None
+
+    return thumb
+
+
+def _thumbnail_crop(
+    src_size: tuple[int, int], dst_size: tuple[int, int], thumb: bytes, rotated: bool = False
+) -> str | None:
+    """
+    Map the destination framing onto the thumbnail as a jpegtran crop geometry.
+
+    Destination images are cut from the source top-anchored and horizontally
+    centered (see jpegtran.descale / jpegtran.crop). The offset is snapped to
+    the thumbnail's iMCU grid, as jpegtran would otherwise move it and widen
+    the crop; a rotated thumbnail also needs whole iMCUs in both directions.
+
+    Raises:
+        ValueError: if snapping misframes the thumbnail by more than
+            THUMB_SNAP_TOLERANCE (the thumbnail must then be rebuilt).
+    """
+    (w, h), (w2, h2) = src_size, dst_size
+    with Image.open(io.BytesIO(thumb)) as im:
+        if not isinstance(im, JpegImagePlugin.JpegImageFile):
+            raise ValueError(f"thumbnail is not a JPEG ({im.format})")
+        tw, th = im.size
+        bw = JPEG_BLOCK * max(layer[1] for layer in im.layer)
+        bh = JPEG_BLOCK * max(layer[2] for layer in im.layer)
+
+    exact_w, exact_h = w2 * tw / w, h2 * th / h
+    exact_left = (w - w2) / 2 * tw / w
+
+    left = round(exact_left / bw) * bw
+    if rotated:
+        crop_w = min(round(exact_w / bw) * bw, (tw - left) // bw * bw)
+        crop_h = min(round(exact_h / bh) * bh, th // bh * bh)
+    else:
+        crop_w = min(round(exact_w), tw - left)
+        crop_h = min(round(exact_h), th)
+
+    error = max(
+        abs(left - exact_left) / tw,
+        abs(crop_w - exact_w) / tw,
+        abs(crop_h - exact_h) / th,
+    )
+    if crop_w <= 0 or crop_h <= 0 or error > THUMB_SNAP_TOLERANCE:
+        raise ValueError(f"thumbnail framing off the {bw}x{bh} iMCU grid by {error:.1%}")
+
+    if (left, crop_w, crop_h) == (0, tw, th):
+        return None
+    return f"{crop_w}x{crop_h}+{left}+0"
+
+
+def _transform_thumbnail(
+    thumb: bytes,
+    src_size: tuple[int, int],
+    dst_size: tuple[int, int],
+    rotated: bool,
+) -> bytes:
+    """Losslessly crop and/or rotate a thumbnail to match the destination framing."""
+    crop_geo = _thumbnail_crop(src_size, dst_size, thumb, rotated)
+    if crop_geo is not None:
+        thumb = transform_bytes(thumb, ["-crop", crop_geo])
+    if rotated:
+        thumb = transform_bytes(thumb, ["-rotate", "180", "-perfect"])
+    return thumb
+
 
 def _rebuild_exif_thumbnail(fp: Path, img: pyexiv2.Image) -> None:
-    img.exif_thumbnail = None  # remove any residue
+    img.clear_thumbnail()  # remove any residue
 
     with Image.open(fp) as im:
-        # im = im.copy()
         im.thumbnail(THUMB_SIZE, Image.Resampling.LANCZOS)
         buf = io.BytesIO()
         im.save(buf, format="JPEG", quality=70, subsampling=1)
-        img.exif_thumbnail = buf.getvalue()
+        img.modify_thumbnail(buf.getvalue())
 
 
-def copy(fp_src: Path, fp_dst: Path) -> Path:
+@dataclass(frozen=True)
+class Captured:
+    """Metadata read once from a source file, ready to be applied to outputs."""
+
+    name: str
+    size: tuple[int, int]
+    exif: dict[str, str]
+    iptc: dict[str, Any]
+    xmp: dict[str, Any]
+    thumbnail: bytes | None
+
+
+def capture(fp_src: Path, want_thumbnail: bool = True) -> Captured:
     """
-    Copy EXIF/IPTC/XMP metadata from fp_src to fp_dst,
-    stripping broken thumbnails and rebuilding a clean one.
+    Read EXIF/IPTC/XMP and the (validated) thumbnail of fp_src.
+
+    Pass want_thumbnail=False when every output is reframed, so the
+    thumbnail would be rebuilt anyway and need not be validated.
+    """
+    with pyexiv2.Image(str(fp_src)) as src:
+        exif = src.read_exif()
+
+        # Strip thumbnail tags BEFORE writing
+        for tag in THUMB_TAGS:
+            exif.pop(tag, None)
+
+        return Captured(
+            name=fp_src.name,
+            size=(src.get_pixel_width(), src.get_pixel_height()),
+            exif=exif,
+            iptc=src.read_iptc(),
+            xmp=src.read_xmp(),
+            thumbnail=read_valid_thumbnail(fp_src) if want_thumbnail else None,
+        )
+
+
+def apply(
+    meta: Captured,
+    fp_dst: Path,
+    *,
+    rotated: bool = False,
+    reframed: bool = True,
+) -> Path:
+    """
+    Write captured metadata to fp_dst.
+
+    The source thumbnail is reused (cropped/rotated losslessly to follow
+    fp_dst) when it is intact and the framing was only trimmed or rotated.
+    It is rebuilt from fp_dst when broken, missing or when ``reframed``
+    (e.g. a scale bar was added).
     """
     try:
-        with pyexiv2.Image(str(fp_src)) as src, pyexiv2.Image(str(fp_dst)) as dst:
-            exif = src.read_exif()
+        thumb = None if reframed else meta.thumbnail
 
-            # Strip thumbnail tags BEFORE writing
-            for tag in THUMB_TAGS:
-                exif.pop(tag, None)
+        with pyexiv2.Image(str(fp_dst)) as dst:
+            dst.modify_exif(meta.exif)
+            dst.modify_iptc(meta.iptc)
+            dst.modify_xmp(meta.xmp)
 
-            dst.modify_exif(exif)
-            dst.modify_iptc(src.read_iptc())
-            dst.modify_xmp(src.read_xmp())
+            if thumb is not None:
+                try:
+                    thumb = _transform_thumbnail(
+                        thumb,
+                        meta.size,
+                        (dst.get_pixel_width(), dst.get_pixel_height()),
+                        rotated,
+                    )
+                except (JpegtranError, OSError, ValueError) as e:
+                    logger.debug("Thumbnail transform failed, rebuilding: %s", e)
+                    thumb = None
 
-            _rebuild_exif_thumbnail(fp_dst, dst)
+            if thumb is not None:
+                dst.clear_thumbnail()
+                dst.modify_thumbnail(thumb)
+            else:
+                _rebuild_exif_thumbnail(fp_dst, dst)
 
         logger.info(
-            "Metadata + thumbnail copied %s → %s",
-            fp_src.name,
+            "Metadata + thumbnail (%s) copied %s → %s",
+            "reused" if thumb is not None else "rebuilt",
+            meta.name,
             fp_dst.name,
         )
 
@@ -56,3 +270,20 @@ def copy(fp_src: Path, fp_dst: Path) -> Path:
         logger.warning("Failed to copy metadata: %s", e)
 
     return fp_dst
+
+
+def copy(
+    fp_src: Path,
+    fp_dst: Path,
+    *,
+    rotated: bool = False,
+    reframed: bool = True,
+) -> Path:
+    """Copy EXIF/IPTC/XMP metadata and thumbnail from fp_src to fp_dst (see apply)."""
+    try:
+        meta = capture(fp_src, want_thumbnail=not reframed)
+    except Exception as e:
+        logger.warning("Failed to copy metadata: %s", e)
+        return fp_dst
+
+    return apply(meta, fp_dst, rotated=rotated, reframed=reframed)
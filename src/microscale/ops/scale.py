@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import os
 import re
 import tempfile
 from pathlib import Path
@@ -7,8 +8,11 @@ from typing import Tuple
 
 from PIL import Image, ImageDraw, ImageFont
 
-from ..config import PIX_PER_MM, SCALE_HEIGHT
-from .concatenate import concatenate
+from ..config import CROPPED_SUFFIX, PIX_PER_MM, SCALE_HEIGHT, SCALED_SUFFIX
+from .concatenate import MetadataOption, concatenate
+from .jpegtran import image_size, run_jpegtran
+
+SCALE_SUBSAMPLING = 1  # Pillow subsampling of the scale strip (4:2:2)
 
 
 def lens_label(fp_stem: str) -> str:
@@ -22,10 +26,13 @@ def lens_label(fp_stem: str) -> str:
     return label.lower()
 
 
-def add_scale(fp: Path, fp_out: Path) -> Path:
-    """Add a black scale bar at the bottom of the image using SCALE_HEIGHT."""
-    with Image.open(fp) as im:
-        w, h = im.size
+def add_scale(fp: Path, fp_out: Path, size: tuple[int, int] | None = None) -> Path:
+    """
+    Add a black scale bar at the bottom of the image using SCALE_HEIGHT.
+
+    size: (width, height) of fp if already known, to skip reading its header.
+    """
+    w, h = image_size(fp, size)
 
     assert SCALE_HEIGHT % 8 == 0, "SCALE_HEIGHT must be multiple of 8"
 
@@ -43,6 +50,62 @@ def add_scale(fp: Path, fp_out: Path) -> Path:
     return fp_out
 
 
+def replace_scale(
+    fp: Path,
+    fp_out: Path,
+    metadata: MetadataOption = "all",
+    size: tuple[int, int] | None = None,
+) -> Path:
+    """
+    Overwrite the old scale bar (bottom SCALE_HEIGHT rows) with a new one in one pass.
+
+    Equivalent to descale + add_scale when the bar starts on an iMCU row,
+    but with a single jpegtran -drop on the original file. Metadata markers
+    are copied by jpegtran, so no separate metadata pass is needed.
+
+    Only files named as scaled (stem ending in SCALED_SUFFIX) carry a bar;
+    anything else, e.g. a descaled master, is rejected. size is as for add_scale.
+    """
+    if not fp.stem.endswith(SCALED_SUFFIX):
+        raise ValueError(
+            f"{fp.name}: no scale bar to replace (stem must end in '{SCALED_SUFFIX}')"
+        )
+
+    w, h = image_size(fp, size)
+
+    top = h - SCALE_HEIGHT
+    if top <= 0:
+        raise ValueError(f"{fp.name}: scale height ({SCALE_HEIGHT}) exceeds image height ({h})")
+
+    # Label as drawn on the descaled file by descale + add_scale
+    label = fp.stem[:-1] + CROPPED_SUFFIX
+    pix_per_mm = PIX_PER_MM[lens_label(label)]
+    fp_scale = make_temp_scale((w, SCALE_HEIGHT), pix_per_mm, label)
+
+    with tempfile.NamedTemporaryFile(suffix=".jpg", dir=fp_out.parent, delete=False) as tmp_file:
+        tmp_path = Path(tmp_file.name)
+
+    try:
+        cmd = [
+            "-copy",
+            metadata,
+            "-perfect",
+            "-drop",
+            f"+0+{top}",
+            str(fp_scale),
+            "-outfile",
+            str(tmp_path),
+            str(fp),
+        ]
+        run_jpegtran(cmd)
+        os.replace(tmp_path, fp_out)
+    finally:
+        fp_scale.unlink(missing_ok=True)
+        tmp_path.unlink(missing_ok=True)
+
+    return fp_out
+
+
 def make_temp_scale(size: Tuple[int, int], pix_per_mm: float, label: str) -> Path:
     """Create a temporary scale image with black background, white line, and text."""
     wid, hei = size
@@ -72,7 +135,7 @@ def make_temp_scale(size: Tuple[int, int], pix_per_mm: float, label: str) -> Pat
     # Save to temporary file
     with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as tmp_file:
         out_file = Path(tmp_file.name)
-    img.save(out_file, "JPEG", quality=90, subsampling=1)
+    img.save(out_file, "JPEG", quality=90, subsampling=SCALE_SUBSAMPLING)
 
     return out_file
 
@@ -1,38 +1,71 @@
 from __future__ import annotations
 
+import logging
 import os
+import shutil
+import tempfile
+from collections import Counter
+from collections.abc import Sequence
+from dataclasses import replace
 from pathlib import Path
 
 from .config import CROPPED_SUFFIX, SCALED_SUFFIX
 from .model import Ops
 from .ops import jpegtran, metadata
 from .ops import scale as scale_op
+from .ops.concatenate import MetadataOption
 
+logger = logging.getLogger(__name__)
 
-def process_image(fp: Path, ops: Ops) -> Path:
+Plan = tuple[str, ...]
+
+# Metadata jpegtran carries over while re-stamping a scale bar, per rescale stage
+RESCALE_MARKERS: dict[str, MetadataOption] = {"rescale": "all", "rescale-noiptc": "comments"}
+
+
+def process_image(fp: Path, ops: Ops, size: tuple[int, int] | None = None) -> Path:
     """
     Apply a sequence of image operations (descale, crop, rotate, scale) to a JPEG file.
 
     Args:
         fp: Path to the input JPEG file.
         ops: Ops object containing boolean flags for each operation.
+        size: (width, height) of fp if already probed (see preflight), so the
+            first operation does not read the header again.
 
     Returns:
-        Path to the processed file (last operation output).
+        Path to the processed file (last operation output). With ops.variants,
+        the output of the primary ops; see process_variants.
     """
+    if ops.variants or ops.tag:
+        return process_variants(fp, [replace(ops, variants=()), *ops.variants], size)[0]
+
+    if ops.rescale and (ops.descale or ops.crop or ops.rotate):
+        raise ValueError("Cannot combine rescale with descale, crop or rotate")
+
     # Preserve original access/modification times
     orig_stat = fp.stat()
     fp_src = Path(fp)
 
+    # Re-stamp the scale bar over the old one; jpegtran keeps the metadata
+    if ops.rescale:
+        (stage,) = stages(ops)
+        fp_out = stage_path(fp, stage)
+        fp = scale_op.replace_scale(fp, fp_out, metadata=RESCALE_MARKERS[stage], size=size)
+        os.utime(fp, (orig_stat.st_atime, orig_stat.st_mtime))
+        return fp
+
     # Descale: remove bottom SCALE_HEIGHT pixels if requested
     if ops.descale:
         fp_out = fp.with_stem(fp.stem[:-1] + CROPPED_SUFFIX)
-        fp = jpegtran.descale(fp, fp_out)
+        fp = jpegtran.descale(fp, fp_out, size=size)
+        size = None
 
     # Crop to TARGET_RATIO if requested
     if ops.crop:
         fp_out = fp.with_stem(fp.stem + CROPPED_SUFFIX)
-        fp = jpegtran.crop(fp, fp_out)
+        fp = jpegtran.crop(fp, fp_out, size=size)
+        size = None
 
     # Rotate 180° if requested
     if ops.rotate:
@@ -47,13 +80,141 @@ def process_image(fp: Path, ops: Ops) -> Path:
             fp_src = bak
 
         fp_cropped = fp
-        fp = scale_op.add_scale(fp, fp_out)
+        fp = scale_op.add_scale(fp, fp_out, size=size)  # 180° rotation keeps the size
         fp_cropped.unlink(missing_ok=True)
 
-    # Restore metadata if requested
+    # Restore metadata if requested; the source thumbnail survives unless a bar was added
     if not ops.noiptc:
-        fp = metadata.copy(fp_src, fp)
+        fp = metadata.copy(fp_src, fp, rotated=ops.rotate, reframed=ops.scale)
 
     # Restore original timestamps
     os.utime(fp, (orig_stat.st_atime, orig_stat.st_mtime))
     return fp
+
+
+def stages(ops: Ops) -> Plan:
+    """Names of the stages ops run, in the order process_image runs them."""
+    if ops.rescale:
+        # jpegtran copies the metadata itself, so noiptc is part of the stage
+        return ("rescale-noiptc" if ops.noiptc else "rescale",)
+    flags = (
+        ("descale", ops.descale),
+        ("crop", ops.crop),
+        ("rotate", ops.rotate),
+        ("scale", ops.scale),
+    )
+    return tuple(name for name, on in flags if on)
+
+
+def stage_path(fp: Path, stage: str) -> Path:
+    """Output path of a stage, named as process_image names it."""
+    if stage == "descale":
+        return fp.with_stem(fp.stem[:-1] + CROPPED_SUFFIX)
+    if stage == "crop":
+        return fp.with_stem(fp.stem + CROPPED_SUFFIX)
+    if stage == "scale" or stage in RESCALE_MARKERS:
+        return fp.with_stem(fp.stem[:-1] + SCALED_SUFFIX)
+    return fp  # rotate works in place
+
+
+def output_path(fp: Path, plan: Plan, tag: str) -> Path:
+    """Final output path of fp after the stages of plan, with tag appended."""
+    for stage in plan:
+        fp = stage_path(fp, stage)
+    return fp.with_stem(fp.stem + tag)
+
+
+def _run_stage(
+    fp: Path, stage: str, workdir: Path, size: tuple[int, int] | None = None
+) -> Path:
+    """Run one stage on fp, writing a new file in workdir (the input is left intact)."""
+    workdir.mkdir()
+    fp_out = workdir / stage_path(fp, stage).name
+
+    if stage == "descale":
+        return jpegtran.descale(fp, fp_out, size=size)
+    if stage == "crop":
+        return jpegtran.crop(fp, fp_out, size=size)
+    if stage == "rotate":
+        shutil.copy2(fp, fp_out)
+        return jpegtran.rotate(fp_out)
+    if stage in RESCALE_MARKERS:
+        return scale_op.replace_scale(fp, fp_out, metadata=RESCALE_MARKERS[stage], size=size)
+    return scale_op.add_scale(fp, fp_out, size=size)
+
+
+def process_variants(
+    fp: Path, variants: Sequence[Ops], size: tuple[int, int] | None = None
+) -> list[Path]:
+    """
+    Produce several output variants of one JPEG file from a single read.
+
+    Variants sharing leading stages (descale/crop, rotate, scale) share the
+    intermediate files, and source metadata is captured once for all outputs.
+    As in process_image, the source is kept as .bak when a scaled output
+    takes its name, while rotate or rescale alone replace it in place.
+
+    Args:
+        fp: Path to the input JPEG file.
+        variants: Ops of each output; tags must make the output names unique.
+        size: (width, height) of fp if already probed (see process_image).
+
+    Returns:
+        Paths to the outputs, in the order of variants.
+    """
+    orig_stat = fp.stat()
+    plans = [stages(v) for v in variants]
+    outputs = [output_path(fp, plan, v.tag) for v, plan in zip(variants, plans)]
+
+    if any(v.descale and v.crop for v in variants):
+        raise ValueError(f"{fp.name}: Cannot use both descale and crop")
+    if any(v.rescale and (v.descale or v.crop or v.rotate) for v in variants):
+        raise ValueError(f"{fp.name}: Cannot combine rescale with descale, crop or rotate")
+    if len(set(outputs)) != len(outputs):
+        raise ValueError(f"{fp.name}: variants produce the same output name, use distinct tags")
+
+    # Rescaled outputs keep the metadata through jpegtran; the others get it applied
+    applied = [not (v.noiptc or v.rescale) for v in variants]
+    meta = None
+    if any(applied):
+        reuse_thumbnail = any(not v.scale for v, a in zip(variants, applied) if a)
+        try:
+            meta = metadata.capture(fp, want_thumbnail=reuse_thumbnail)
+        except Exception as e:
+            logger.warning("Failed to copy metadata: %s", e)
+
+    with tempfile.TemporaryDirectory(prefix=".microscale-", dir=fp.parent) as tmp:
+        # Run each distinct stage prefix once
+        done: dict[Plan, Path] = {(): fp}
+        for plan in plans:
+            for i in range(1, len(plan) + 1):
+                if plan[:i] not in done:
+                    workdir = Path(tmp) / str(len(done))
+                    parent = plan[: i - 1]
+                    # Only stages reading the source (or its 180° rotation) know its size
+                    known = size if all(s == "rotate" for s in parent) else None
+                    done[plan[:i]] = _run_stage(done[parent], plan[i - 1], workdir, known)
+
+        # Keep the source when a scaled output takes its name
+        if any(out == fp for out, plan in zip(outputs, plans) if "scale" in plan):
+            bak = fp.with_suffix(".bak")
+            fp.rename(bak)
+            done[()] = bak
+
+        uses = Counter(plans)
+        # Outputs replacing the source go last, the others may still copy it
+        order = sorted(zip(variants, plans, outputs, applied), key=lambda t: t[2] == fp)
+        for v, plan, fp_out, apply in order:
+            uses[plan] -= 1
+            if fp_out == done[plan]:
+                continue  # no-op variant
+            if plan and uses[plan] == 0:
+                os.replace(done[plan], fp_out)
+            else:
+                shutil.copy2(done[plan], fp_out)
+
+            if meta is not None and apply:
+                metadata.apply(meta, fp_out, rotated=v.rotate, reframed=v.scale)
+            os.utime(fp_out, (orig_stat.st_atime, orig_stat.st_mtime))
+
+    return outputs
@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import logging
+import os
+from collections.abc import Sequence
+from dataclasses import dataclass
+from multiprocessing.pool import ThreadPool
+from pathlib import Path
+
+from PIL import Image, JpegImagePlugin
+
+from .config import PIX_PER_MM, SCALE_HEIGHT, SCALED_SUFFIX, TARGET_RATIO
+from .model import Ops
+from .ops.jpegtran import JPEG_BLOCK, round_down_block
+from .ops.scale import SCALE_SUBSAMPLING, lens_label
+from .pipeline import output_path, stage_path, stages
+
+logger = logging.getLogger(__name__)
+
+SAMPLING_NAMES = {0: "4:4:4", 1: "4:2:2", 2: "4:2:0"}
+
+
+@dataclass(frozen=True)
+class Probe:
+    """JPEG header facts needed to validate a planned run."""
+
+    path: Path
+    size: tuple[int, int]
+    sampling: int  # Pillow subsampling: 0=4:4:4, 1=4:2:2, 2=4:2:0, -1=other
+    imcu: tuple[int, int]  # iMCU width, height in pixels
+
+
+@dataclass(frozen=True)
+class Problem:
+    path: Path
+    message: str
+
+    def __str__(self) -> str:
+        return f"{self.path.name}: {self.message}"
+
+
+def probe(fp: Path) -> Probe:
+    """Read the JPEG header of fp (no pixel data is decoded)."""
+    with Image.open(fp) as im:
+        if not isinstance(im, JpegImagePlugin.JpegImageFile):
+            raise ValueError(f"not a JPEG ({im.format})")
+        h_max = max(layer[1] for layer in im.layer)
+        v_max = max(layer[2] for layer in im.layer)
+        return Probe(
+            path=fp,
+            size=im.size,
+            sampling=JpegImagePlugin.get_sampling(im),
+            imcu=(JPEG_BLOCK * h_max, JPEG_BLOCK * v_max),
+        )
+
+
+def check(p: Probe, ops: Ops) -> list[str]:
+    """Return the reasons the pipeline would fail on p with ops, mirroring each stage."""
+    w, h = p.size
+    fp = p.path
+
+    if ops.descale and ops.crop:
+        return ["cannot use both descale and crop"]
+
+    if ops.rescale:
+        if ops.descale or ops.crop or ops.rotate:
+            return ["cannot combine rescale with descale, crop or rotate"]
+        if not fp.stem.endswith(SCALED_SUFFIX):
+            return [f"no scale bar to replace (stem must end in '{SCALED_SUFFIX}')"]
+        if h - SCALE_HEIGHT <= 0:
+            return [f"scale height ({SCALE_HEIGHT}) exceeds image height ({h})"]
+        # The new bar is dropped where the old one starts, labelled as if descaled
+        return _check_scale(p, stage_path(fp, "descale").stem, h - SCALE_HEIGHT)
+
+    if ops.descale:
+        if h - SCALE_HEIGHT <= 0:
+            return [f"scale height ({SCALE_HEIGHT}) exceeds image height ({h})"]
+        h = round_down_block(h - SCALE_HEIGHT)
+
+    if ops.crop:
+        if w / h <= TARGET_RATIO:
+            return [f"cannot crop - image ratio {w / h:.3f} < target {TARGET_RATIO}"]
+        w, h = round_down_block(int(h * TARGET_RATIO)), round_down_block(h)
+
+    if not ops.scale:
+        return []
+
+    stem = output_path(fp, tuple(s for s in stages(ops) if s != "scale"), "").stem
+    return _check_scale(p, stem, h)
+
+
+def _check_scale(p: Probe, stem: str, top: int) -> list[str]:
+    """Check a scale bar labelled from stem can be dropped at row top."""
+    problems = []
+    try:
+        label = lens_label(stem)
+        if label not in PIX_PER_MM:
+            problems.append(f"lens '{label}' has no PIX_PER_MM calibration")
+    except ValueError as e:
+        problems.append(str(e))
+
+    if p.sampling != SCALE_SUBSAMPLING:
+        name = SAMPLING_NAMES.get(p.sampling, "non-YCbCr")
+        problems.append(
+            f"sampling {name} does not match scale bar {SAMPLING_NAMES[SCALE_SUBSAMPLING]}"
+        )
+    if top % p.imcu[1]:
+        problems.append(f"height {top} is not a multiple of the {p.imcu[1]}-row iMCU")
+
+    return problems
+
+
+def _probe_or_error(fp: Path) -> Probe | str:
+    try:
+        return probe(fp)
+    except Exception as e:
+        return str(e)
+
+
+def preflight(
+    files: Sequence[Path], ops: Ops, jobs: int = 0
+) -> tuple[dict[Path, Probe], list[Problem]]:
+    """
+    Probe all files in parallel and check them against ops (and its variants).
+
+    jobs is the number of probing threads, 0 for one per CPU.
+
+    Pass each probe's size to process_image so the real run does not read
+    the headers again.
+
+    Returns:
+        Probes by path, and every problem found.
+    """
+    with ThreadPool(jobs or os.cpu_count()) as pool:
+        results = pool.map(_probe_or_error, files)
+
+    all_ops = [ops, *ops.variants]
+    probes: dict[Path, Probe] = {}
+    problems: list[Problem] = []
+
+    for fp, res in zip(files, results):
+        if isinstance(res, str):
+            problems.append(Problem(fp, res))
+            continue
+
+        probes[fp] = res
+        messages = dict.fromkeys(msg for o in all_ops for msg in check(res, o))
+        problems.extend(Problem(fp, msg) for msg in messages)
+
+    logger.info("Preflight: %d files, %d problems", len(files), len(problems))
+    return probes, problems
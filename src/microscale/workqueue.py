@@ -0,0 +1,336 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import socket
+import threading
+import time
+from collections.abc import Iterator, Mapping, Sequence
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from multiprocessing import Pool
+from pathlib import Path
+from typing import Any
+
+from .model import Job, Ops
+from .pipeline import process_image
+
+logger = logging.getLogger(__name__)
+
+LEASE_TIMEOUT = 300.0  # seconds without heartbeat before a claim is considered dead
+HEARTBEAT_INTERVAL = 30.0  # seconds between lease refreshes
+PUBLISH_DIR = "publish"  # staged outputs complete, being moved into place
+OUTPUT_NOTE = ".output"  # name of the main output in a staging directory
+
+Record = dict[str, Any]
+
+
+@dataclass(frozen=True)
+class WorkQueue:
+    """
+    File-based work queue in a directory shared by several hosts.
+
+    Layout::
+
+        claims/<key>       exclusive lease, mtime refreshed by heartbeat
+        done/<key>         JSON record of a success, written before the claim is released
+        results/<node>.jsonl  per-node result log (see merge_results)
+
+    Claims are created with O_CREAT | O_EXCL, so exactly one process wins.
+    A claim whose mtime is older than lease_timeout belongs to a crashed
+    node and is reclaimed. Host clocks must agree within lease_timeout.
+    Holders check that the claim still names them (see owns) while working
+    and before completing, and give up once it does not.
+
+    Jobs are identified by the file path relative to share_root (default:
+    the parent of the queue directory), so every input must live below it,
+    and by their ops: rerunning with other ops processes the files again.
+    Failed jobs are not marked done, so a later run retries them.
+    """
+
+    root: Path
+    node: str = field(default_factory=socket.gethostname)
+    lease_timeout: float = LEASE_TIMEOUT
+    heartbeat: float = HEARTBEAT_INTERVAL
+    share_root: Path | None = None
+
+    def __post_init__(self) -> None:
+        for sub in ("claims", "done", "results"):
+            (self.root / sub).mkdir(parents=True, exist_ok=True)
+
+    def key(self, job: Job) -> str:
+        """
+        Stable key for job, the same on every host whatever the mount point.
+
+        It is derived from the path relative to share_root and the ops. File
+        contents and size are not used, since in-place operations (rotate)
+        change them.
+        """
+        fp = job.path
+        share_root = self.root.parent if self.share_root is None else self.share_root
+        try:
+            rel = fp.resolve().relative_to(share_root.resolve())
+        except ValueError:
+            raise ValueError(f"{fp} is not below the queue share root {share_root}") from None
+
+        ident = f"{rel.as_posix()}\n{job.ops!r}"
+        digest = hashlib.sha1(ident.encode()).hexdigest()[:12]
+        return f"{fp.name}.{digest}"
+
+    def _claim_path(self, job: Job) -> Path:
+        return self.root / "claims" / self.key(job)
+
+    def _done_path(self, job: Job) -> Path:
+        return self.root / "done" / self.key(job)
+
+    def is_done(self, job: Job) -> bool:
+        return self._done_path(job).exists()
+
+    def _create_claim(self, path: Path) -> bool:
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w") as f:
+            json.dump({"node": self.node, "pid": os.getpid(), "time": time.time()}, f)
+        return True
+
+    @staticmethod
+    def _read_claim(path: Path) -> Record | None:
+        try:
+            claim: Record = json.loads(path.read_text())
+        except (OSError, ValueError):
+            return None
+        return claim
+
+    def owns(self, job: Job) -> bool:
+        """Whether the claim on job is held by this process."""
+        claim = self._read_claim(self._claim_path(job))
+        if claim is None:
+            return False
+        return (claim.get("node"), claim.get("pid")) == (self.node, os.getpid())
+
+    def _reclaim_stale(self, path: Path) -> None:
+        """
+        Move a dead claim out of the way.
+
+        Another node may reclaim it between the age check and the rename and
+        create a live claim, which is then moved instead. Putting it back
+        would race a third node, so its holder is left to notice the loss.
+        """
+        try:
+            age = time.time() - path.stat().st_mtime
+        except FileNotFoundError:
+            return
+        if age <= self.lease_timeout:
+            return
+
+        stale = self._read_claim(path)
+        moved = path.with_name(f"{path.name}.stale.{self.node}.{os.getpid()}")
+        try:
+            path.rename(moved)
+        except FileNotFoundError:
+            return  # another node got there first
+
+        if self._read_claim(moved) == stale:
+            logger.warning("%s: reclaiming stale claim (%.0f s old)", path.name, age)
+        else:
+            logger.warning("%s: moved a live claim, its holder will give up", path.name)
+        moved.unlink(missing_ok=True)
+
+    def try_claim(self, job: Job) -> bool:
+        """Claim job for this node. Returns False if done or held by a live node."""
+        if self.is_done(job):
+            return False
+
+        path = self._claim_path(job)
+        if not self._create_claim(path):
+            self._reclaim_stale(path)
+            if not self._create_claim(path):
+                return False
+
+        # The previous holder writes done/ before releasing its claim
+        if self.is_done(job):
+            path.unlink(missing_ok=True)
+            return False
+        return True
+
+    @contextmanager
+    def lease(self, job: Job) -> Iterator[threading.Event]:
+        """
+        Keep the claim on job alive with a heartbeat while the block runs.
+
+        Yields an event that is set once the claim no longer belongs to us.
+        """
+        path = self._claim_path(job)
+        stop = threading.Event()
+        lost = threading.Event()
+
+        def beat() -> None:
+            while not stop.wait(self.heartbeat):
+                try:
+                    if self.owns(job):
+                        os.utime(path)
+                        continue
+                except FileNotFoundError:
+                    pass
+                logger.warning("%s: lease lost", job.path.name)
+                lost.set()
+                return
+
+        thread = threading.Thread(target=beat, daemon=True)
+        thread.start()
+        try:
+            yield lost
+        finally:
+            stop.set()
+            thread.join()
+
+    def complete(self, job: Job, record: Record) -> bool:
+        """
+        Mark job as done if it succeeded, and release the claim.
+
+        Returns False, changing nothing, if the claim is no longer ours.
+        """
+        if not self.owns(job):
+            return False
+        if record.get("status") == "ok":
+            self._done_path(job).write_text(json.dumps(record))
+        self._claim_path(job).unlink(missing_ok=True)
+        return True
+
+    def log_result(self, record: Record) -> None:
+        with (self.root / "results" / f"{self.node}.jsonl").open("a") as f:
+            f.write(json.dumps(record) + "\n")
+
+
+def merge_results(root: Path) -> list[Record]:
+    """Merge the per-node result logs of a queue directory, ordered by end time."""
+    records: list[Record] = []
+    for log in sorted((root / "results").glob("*.jsonl")):
+        with log.open() as f:
+            records.extend(json.loads(line) for line in f if line.strip())
+    return sorted(records, key=lambda r: r.get("end", 0.0))
+
+
+def _stage(job: Job, work: Path, size: tuple[int, int] | None) -> None:
+    """Process a copy of the source in work, leaving the source itself intact."""
+    work.mkdir(parents=True)
+    fp = work / job.path.name
+    shutil.copy2(job.path, fp)
+    out = process_image(fp, job.ops, size)
+    (work / OUTPUT_NOTE).write_text(out.name)
+
+
+def _publish(ready: Path, dest: Path) -> Path:
+    """Move the staged files of ready into dest; repeating it after a crash is safe."""
+    for f in sorted(ready.iterdir()):
+        if f.is_file() and f.name != OUTPUT_NOTE:
+            os.replace(f, dest / f.name)
+    return dest / (ready / OUTPUT_NOTE).read_text()
+
+
+def process_claimed(
+    fp: Path, ops: Ops, queue: WorkQueue, size: tuple[int, int] | None = None
+) -> Record | None:
+    """
+    Process fp if this node can claim it. Returns the result record or None.
+
+    The pipeline runs on a copy in a staging directory next to fp (several
+    ops rewrite their input in place). Once it succeeded, and only if the
+    claim is still ours, the directory is renamed to PUBLISH_DIR and its
+    files moved into place. A node reclaiming a crashed job so tells a run
+    that never published, which it restarts from the intact source, from
+    one that did, which it finishes publishing.
+    """
+    job = Job(fp, ops)
+    if not queue.try_claim(job):
+        return None
+
+    key = queue.key(job)
+    record: Record = {
+        "file": str(fp),
+        "key": key,
+        "node": queue.node,
+        "start": time.time(),
+    }
+    base = fp.parent / f".microscale-queue-{key}"
+    work = base / f"{queue.node}.{os.getpid()}"
+    ready = base / PUBLISH_DIR
+
+    try:
+        with queue.lease(job) as lost:
+            if ready.is_dir():
+                logger.info("%s: finishing an interrupted publish", fp.name)
+            else:
+                shutil.rmtree(base, ignore_errors=True)  # left by dead or lost holders
+                _stage(job, work, size)
+                if lost.is_set() or not queue.owns(job):
+                    shutil.rmtree(work, ignore_errors=True)
+                    logger.warning("%s: claim taken over by another node", fp.name)
+                    return None
+                work.rename(ready)
+            out = _publish(ready, fp.parent)
+        record.update(status="ok", output=str(out))
+    except Exception as e:
+        logger.error("%s: %s", fp.name, e)
+        record.update(status="error", error=str(e))
+        shutil.rmtree(work, ignore_errors=True)
+
+    record["end"] = time.time()
+    if not queue.complete(job, record):
+        logger.warning("%s: claim taken over by another node, result dropped", fp.name)
+        return None
+    if record["status"] == "ok":
+        shutil.rmtree(base, ignore_errors=True)
+    return record
+
+
+def run_queue(
+    queue: WorkQueue,
+    files: Sequence[Path],
+    ops: Ops,
+    jobs: int = 0,
+    sizes: Mapping[Path, tuple[int, int]] | None = None,
+) -> list[Record]:
+    """
+    Process files cooperatively with other nodes sharing queue.root.
+
+    Repeats until every existing file is done or failed on this node, so
+    claims of crashed nodes are picked up once their lease expires. sizes
+    are this node's preflight probes; files probed elsewhere simply read
+    their headers.
+    """
+    sizes = {} if sizes is None else sizes
+    records: list[Record] = []
+    failed: set[Path] = set()
+    pending = list(files)
+
+    while pending:
+        args = [(fp, ops, queue, sizes.get(fp)) for fp in pending]
+        if jobs > 1:
+            with Pool(jobs) as pool:
+                results = pool.starmap(process_claimed, args)
+        else:
+            results = [process_claimed(*a) for a in args]
+
+        for fp, record in zip(pending, results):
+            if record is not None:
+                queue.log_result(record)
+                records.append(record)
+                if record["status"] != "ok":
+                    failed.add(fp)
+
+        pending = [
+            fp
+            for fp in pending
+            if fp not in failed and fp.exists() and not queue.is_done(Job(fp, ops))
+        ]
+        if pending:
+            logger.info("%d files held by other nodes, waiting", len(pending))
+            time.sleep(queue.heartbeat)
+
+    return records
@@ -0,0 +1,74 @@
+# tests/test_extract.py
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any
+from unittest.mock import patch
+
+import pytest
+from PIL import Image
+
+from microscale.extract import extract, load_rois, snap
+from microscale.model import Roi
+
+
+def make_image(path: Path, size: tuple[int, int] = (640, 480)) -> Path:
+    Image.new("RGB", size, (0, 0, 0)).save(path, "JPEG", subsampling=2)
+    return path
+
+
+def test_snap_grows_to_imcu() -> None:
+    roi = snap(Roi(20, 9, 10, 10, "p"), (640, 480), (16, 16))
+    assert roi == Roi(16, 0, 16, 32, "p")
+
+
+def test_snap_clamps_to_image() -> None:
+    roi = snap(Roi(630, 470, 50, 50), (640, 480), (16, 16))
+    assert roi == Roi(624, 464, 16, 16)
+
+
+def test_snap_outside_image() -> None:
+    with pytest.raises(ValueError):
+        snap(Roi(700, 0, 10, 10), (640, 480), (16, 16))
+
+
+def test_load_rois_csv_and_json(tmp_path: Path) -> None:
+    csv_text = "image,x,y,width,height,name\na.jpg,1,2,3,4,g1\na.jpg,5,6,7,8,\n"
+    (tmp_path / "r.csv").write_text(csv_text)
+    rows = [{"image": "a.jpg", "x": 1, "y": 2, "width": 3, "height": 4, "name": "g1"}]
+    (tmp_path / "r.json").write_text(json.dumps(rows))
+
+    from_csv = load_rois(tmp_path / "r.csv")
+    from_json = load_rois(tmp_path / "r.json")
+
+    assert from_csv == {tmp_path / "a.jpg": [Roi(1, 2, 3, 4, "g1"), Roi(5, 6, 7, 8)]}
+    assert from_json == {tmp_path / "a.jpg": [Roi(1, 2, 3, 4, "g1")]}
+
+
+def test_load_rois_invalid(tmp_path: Path) -> None:
+    (tmp_path / "r.csv").write_text("image,x,y\na.jpg,1,2\n")
+    with pytest.raises(ValueError):
+        load_rois(tmp_path / "r.csv")
+
+
+@pytest.mark.parametrize("name", ["..", "../x", "a/b", ".hidden", "g 1"])
+def test_load_rois_unsafe_name(tmp_path: Path, name: str) -> None:
+    rows = [{"image": "a.jpg", "x": 1, "y": 2, "width": 3, "height": 4, "name": name}]
+    (tmp_path / "r.json").write_text(json.dumps(rows))
+    with pytest.raises(ValueError, match="ROI #1"):
+        load_rois(tmp_path / "r.json")
+
+
+@patch("microscale.extract.transform_bytes")
+def test_extract_precuts_band(mock_transform: Any, tmp_path: Path) -> None:
+    fp = make_image(tmp_path / "a.jpg")
+    mock_transform.side_effect = lambda data, args: data
+
+    outs = extract(fp, [Roi(20, 20, 10, 10), Roi(40, 20, 10, 10, "g")], noiptc=True)
+
+    assert [p.name for p in outs] == ["a-roi-001.jpg", "a-roi-g.jpg"]
+    assert all(p.exists() for p in outs)
+    geometries = sorted(call.args[1][1] for call in mock_transform.call_args_list)
+    # band cut once, then each ROI relative to the band
+    assert geometries == ["16x16+0+0", "32x16+16+0", "48x16+16+16"]
@@ -0,0 +1,134 @@
+# tests/test_metadata.py
+from __future__ import annotations
+
+import io
+from pathlib import Path
+from typing import Any
+from unittest.mock import patch
+
+import pyexiv2  # type: ignore
+import pytest
+from PIL import Image, JpegImagePlugin
+
+from microscale.ops import metadata
+from microscale.ops.jpegtran import JpegtranError
+
+
+def make_thumb(size: tuple[int, int] = (160, 120)) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", size, (200, 0, 0)).save(buf, "JPEG")
+    return buf.getvalue()
+
+
+def make_image(path: Path, thumb: bytes | None = None) -> Path:
+    """Create a JPEG with EXIF and optionally an embedded thumbnail."""
+    Image.new("RGB", (640, 480), (0, 100, 0)).save(path, "JPEG")
+    with pyexiv2.Image(str(path)) as img:
+        img.modify_exif({"Exif.Image.Make": "microscale"})
+        if thumb is not None:
+            img.modify_thumbnail(thumb)
+    return path
+
+
+def test_read_valid_thumbnail(tmp_path: Path) -> None:
+    thumb = make_thumb()
+    fp = make_image(tmp_path / "a.jpg", thumb)
+
+    assert metadata.read_valid_thumbnail(fp) == thumb
+
+
+def test_read_valid_thumbnail_missing(tmp_path: Path) -> None:
+    fp = make_image(tmp_path / "a.jpg")
+
+    assert metadata.read_valid_thumbnail(fp) is None
+
+
+def test_read_valid_thumbnail_truncated(tmp_path: Path) -> None:
+    """A thumbnail whose JPEG data is cut short is rejected."""
+    thumb = make_thumb()
+    fp = make_image(tmp_path / "a.jpg", thumb)
+
+    data = fp.read_bytes()
+    start = data.index(thumb)
+    data = data[: start + 40] + b"\x00" * (len(thumb) - 40) + data[start + len(thumb) :]
+    fp.write_bytes(data)
+
+    assert metadata.read_valid_thumbnail(fp) is None
+
+
+def test_read_valid_thumbnail_not_jpeg(tmp_path: Path) -> None:
+    fp = tmp_path / "a.jpg"
+    fp.write_bytes(b"fake")
+
+    assert metadata.read_valid_thumbnail(fp) is None
+
+
+def fake_jpegtran(data: bytes, args: list[str]) -> bytes:
+    """Emulate jpegtran -crop (offset moved to the iMCU grid) and -rotate 180 -perfect."""
+    with Image.open(io.BytesIO(data)) as im:
+        assert isinstance(im, JpegImagePlugin.JpegImageFile)
+        bw = 8 * max(layer[1] for layer in im.layer)
+        bh = 8 * max(layer[2] for layer in im.layer)
+        im.load()
+        if "-crop" in args:
+            size, x, y = args[args.index("-crop") + 1].replace("+", " ").split()
+            cw, ch = (int(v) for v in size.split("x"))
+            x0, y0 = int(x) // bw * bw, int(y) // bh * bh
+            out = im.crop((x0, y0, int(x) + cw, int(y) + ch))
+        else:
+            if im.size[0] % bw or im.size[1] % bh:
+                raise JpegtranError("transformation is not perfect")
+            out = im.rotate(180)
+    buf = io.BytesIO()
+    out.save(buf, "JPEG")
+    return buf.getvalue()
+
+
+def test_thumbnail_crop_geometry() -> None:
+    thumb = make_thumb((160, 120))  # 4:2:0, 16x16 iMCU
+
+    assert metadata._thumbnail_crop((640, 480), (640, 480), thumb) is None
+    assert metadata._thumbnail_crop((640, 480), (512, 480), thumb) == "128x120+16+0"
+    with pytest.raises(ValueError):
+        metadata._thumbnail_crop((640, 480), (560, 480), thumb)  # offset 10 px off grid
+    with pytest.raises(ValueError):
+        metadata._thumbnail_crop((640, 480), (640, 480), thumb, rotated=True)  # 120 rows
+
+
+@patch("microscale.ops.metadata.transform_bytes", side_effect=fake_jpegtran)
+def test_transform_thumbnail_keeps_framing(mock_transform: Any) -> None:
+    thumb = make_thumb((160, 128))
+
+    out = metadata._transform_thumbnail(thumb, (640, 512), (512, 512), rotated=True)
+
+    with Image.open(io.BytesIO(out)) as im:
+        assert im.size == (128, 128)
+        assert im.size[0] / im.size[1] == pytest.approx(512 / 512)
+
+
+@patch("microscale.ops.metadata._rebuild_exif_thumbnail")
+def test_copy_reuses_valid_thumbnail(mock_rebuild: Any, tmp_path: Path) -> None:
+    thumb = make_thumb()
+    fp_src = make_image(tmp_path / "src.jpg", thumb)
+    fp_dst = tmp_path / "dst.jpg"
+    Image.new("RGB", (640, 480)).save(fp_dst, "JPEG")
+
+    metadata.copy(fp_src, fp_dst, reframed=False)
+
+    mock_rebuild.assert_not_called()
+    assert metadata.read_valid_thumbnail(fp_dst) == thumb
+
+
+def test_copy_rebuilds_when_reframed(tmp_path: Path) -> None:
+    fp_src = make_image(tmp_path / "src.jpg", make_thumb())
+    fp_dst = tmp_path / "dst.jpg"
+    Image.new("RGB", (640, 528)).save(fp_dst, "JPEG")
+
+    with patch.object(metadata, "read_valid_thumbnail") as mock_read:
+        metadata.copy(fp_src, fp_dst)
+        mock_read.assert_not_called()
+
+    rebuilt = metadata.read_valid_thumbnail(fp_dst)
+    assert rebuilt is not None
+    with Image.open(io.BytesIO(rebuilt)) as im:
+        assert im.size == (256, 211)
@@ -1,7 +1,12 @@
 from pathlib import Path
+from typing import Any
+from unittest.mock import patch
 
+import pytest
+
+from microscale.cli import parse_args, parse_variant
 from microscale.model import Ops
-from microscale.pipeline import process_image
+from microscale.pipeline import process_image, process_variants
 
 
 def test_pipeline_smoke(tmp_path: Path) -> None:
@@ -12,3 +17,113 @@ def test_pipeline_smoke(tmp_path: Path) -> None:
     out = process_image(fp, ops)
 
     assert out.exists()
+
+
+def fake_stage(fp: Path, fp_out: Path, size: tuple[int, int] | None = None) -> Path:
+    fp_out.write_bytes(fp.read_bytes() + b"+")
+    return fp_out
+
+
+def fake_rotate(fp: Path) -> Path:
+    fp.write_bytes(fp.read_bytes() + b"r")
+    return fp
+
+
+@patch("microscale.pipeline.scale_op.add_scale", side_effect=fake_stage)
+@patch("microscale.pipeline.jpegtran.rotate", side_effect=fake_rotate)
+@patch("microscale.pipeline.jpegtran.descale", side_effect=fake_stage)
+def test_process_variants_shares_stages(
+    mock_descale: Any, mock_rotate: Any, mock_scale: Any, tmp_path: Path
+) -> None:
+    fp = tmp_path / "x_.jpg"
+    fp.write_bytes(b"src")
+
+    variants = [
+        Ops(noiptc=True, descale=True, scale=True),
+        Ops(noiptc=True, descale=True, scale=False),
+        Ops(noiptc=True, descale=True, rotate=True, scale=True, tag="r"),
+    ]
+    outs = process_variants(fp, variants, size=(640, 528))
+
+    assert [p.name for p in outs] == ["x_.jpg", "x#.jpg", "x_r.jpg"]
+    assert outs[0].read_bytes() == b"src++"
+    assert outs[1].read_bytes() == b"src+"
+    assert outs[2].read_bytes() == b"src+r+"
+    assert (tmp_path / "x_.bak").read_bytes() == b"src"
+    assert mock_descale.call_count == 1
+    assert mock_descale.call_args.kwargs["size"] == (640, 528)  # probed source size
+    assert all(call.kwargs["size"] is None for call in mock_scale.call_args_list)
+    assert not list(tmp_path.glob(".microscale-*"))
+
+
+@patch("microscale.pipeline.jpegtran.rotate", side_effect=fake_rotate)
+def test_process_variants_rotates_in_place(mock_rotate: Any, tmp_path: Path) -> None:
+    """A rotate-only output replaces the source without .bak, like process_image."""
+    fp = tmp_path / "a.jpg"
+    fp.write_bytes(b"src")
+
+    outs = process_variants(
+        fp, [Ops(noiptc=True, rotate=True, scale=False), Ops(noiptc=True, scale=False, tag="o")]
+    )
+
+    assert [p.name for p in outs] == ["a.jpg", "ao.jpg"]
+    assert [p.read_bytes() for p in outs] == [b"srcr", b"src"]
+    assert not (tmp_path / "a.bak").exists()
+
+
+def fake_replace_scale(
+    fp: Path, fp_out: Path, metadata: str = "all", size: tuple[int, int] | None = None
+) -> Path:
+    fp_out.write_bytes(fp.read_bytes() + metadata.encode())
+    return fp_out
+
+
+@patch("microscale.pipeline.metadata.apply")
+@patch("microscale.pipeline.metadata.capture")
+@patch("microscale.pipeline.scale_op.replace_scale", side_effect=fake_replace_scale)
+def test_process_variants_rescale_keeps_metadata(
+    mock_replace: Any, mock_capture: Any, mock_apply: Any, tmp_path: Path
+) -> None:
+    """Rescaled outputs get their metadata from jpegtran only, as noiptc asks."""
+    fp = tmp_path / "x_.jpg"
+    fp.write_bytes(b"src")
+
+    outs = process_variants(fp, [Ops(rescale=True), Ops(noiptc=True, rescale=True, tag="n")])
+
+    assert [p.read_bytes() for p in outs] == [b"srcall", b"srccomments"]
+    assert mock_replace.call_count == 2
+    mock_capture.assert_not_called()
+    mock_apply.assert_not_called()
+
+
+def test_process_variants_duplicate_names(tmp_path: Path) -> None:
+    fp = tmp_path / "a.jpg"
+    fp.write_bytes(b"fake")
+
+    with pytest.raises(ValueError):
+        process_variants(fp, [Ops(rotate=True, scale=False), Ops(scale=False)])
+
+
+def test_parse_variant() -> None:
+    assert parse_variant("descale, rotate,scale:r") == Ops(
+        descale=True, rotate=True, scale=True, tag="r"
+    )
+    assert parse_variant("descale") == Ops(descale=True, scale=False)
+    with pytest.raises(ValueError):
+        parse_variant("descale,shrink")
+
+
+def test_rescale_rejects_other_geometry(tmp_path: Path) -> None:
+    fp = tmp_path / "a.jpg"
+    fp.write_bytes(b"fake")
+
+    with pytest.raises(ValueError):
+        process_image(fp, Ops(rescale=True, descale=True))
+
+
+def test_parse_args_subcommands() -> None:
+    assert parse_args(["--descale", "a.jpg"]).command == "run"
+    assert parse_args(["run", "--descale", "a.jpg"]).descale
+    assert parse_args(["check", "--rescale", "a.jpg"]).command == "check"
+    args = parse_args(["extract", "r.csv", "-o", "out"])
+    assert (args.command, args.out) == ("extract", Path("out"))
@@ -0,0 +1,92 @@
+# tests/test_preflight.py
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any
+from unittest.mock import patch
+
+from PIL import Image
+
+from microscale.model import Ops
+from microscale.ops import jpegtran
+from microscale.preflight import check, preflight, probe
+
+STEM = "2555v1_vi_s_N4_25112210990_39_"
+
+
+def make_image(path: Path, size: tuple[int, int] = (1200, 1048), subsampling: int = 1) -> Path:
+    Image.new("RGB", size, (0, 0, 0)).save(path, "JPEG", subsampling=subsampling)
+    return path
+
+
+def test_probe(tmp_path: Path) -> None:
+    p = probe(make_image(tmp_path / "a.jpg", subsampling=2))
+
+    assert p.size == (1200, 1048)
+    assert p.sampling == 2
+    assert p.imcu == (16, 16)
+
+
+def test_check_valid(tmp_path: Path) -> None:
+    p = probe(make_image(tmp_path / f"{STEM}.jpg"))
+
+    assert check(p, Ops(descale=True, rotate=True, scale=True)) == []
+
+
+def test_check_reports_all_scale_problems(tmp_path: Path) -> None:
+    p = probe(make_image(tmp_path / "bad.jpg", size=(1200, 1050), subsampling=2))
+
+    problems = check(p, Ops(scale=True))
+
+    assert len(problems) == 3
+    assert "lens label" in problems[0]
+    assert "sampling" in problems[1]
+    assert "iMCU" in problems[2]
+
+
+def test_check_crop_ratio(tmp_path: Path) -> None:
+    p = probe(make_image(tmp_path / f"{STEM}.jpg", size=(800, 1000)))
+
+    assert "cannot crop" in check(p, Ops(crop=True, scale=False))[0]
+
+
+def test_preflight_collects_problems(tmp_path: Path) -> None:
+    good = make_image(tmp_path / f"{STEM}.jpg")
+    missing = tmp_path / "missing.jpg"
+    unknown_lens = make_image(tmp_path / "2555v1_vi_s_X9_1_39_.jpg")
+    ops = Ops(descale=True, scale=True)
+
+    probes, problems = preflight([good, missing, unknown_lens], ops, jobs=2)
+
+    assert set(probes) == {good, unknown_lens}
+    assert [p.path for p in problems] == [missing, unknown_lens]
+    assert "PIX_PER_MM" in problems[1].message
+
+
+@patch("microscale.ops.jpegtran.run_jpegtran")
+def test_probed_size_skips_header_read(mock_run: Any, tmp_path: Path) -> None:
+    fp = make_image(tmp_path / f"{STEM}.jpg")
+    probes, _ = preflight([fp], Ops(descale=True, scale=False))
+
+    with patch("microscale.ops.jpegtran.Image.open") as mock_open:
+        jpegtran.descale(fp, tmp_path / "out.jpg", size=probes[fp].size)
+        mock_open.assert_not_called()
+
+    args: list[str] = mock_run.call_args[0][0]
+    assert args[args.index("-crop") + 1] == "1200x1000+0+0"
+
+
+def test_check_rescale(tmp_path: Path) -> None:
+    p = probe(make_image(tmp_path / f"{STEM}.jpg"))
+    assert check(p, Ops(rescale=True)) == []
+
+    p = probe(make_image(tmp_path / f"{STEM}.jpg", size=(1200, 1052)))
+    assert "iMCU" in check(p, Ops(rescale=True))[0]
+    assert "cannot combine" in check(p, Ops(rescale=True, rotate=True))[0]
+
+
+def test_check_rescale_requires_scaled_file(tmp_path: Path) -> None:
+    """A descaled master has no bar; rescaling it would overwrite the deliverable."""
+    p = probe(make_image(tmp_path / f"{STEM[:-1]}#.jpg"))
+
+    assert "no scale bar" in check(p, Ops(rescale=True))[0]
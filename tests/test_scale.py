@@ -9,7 +9,13 @@ from PIL import Image
 
 from microscale.config import SCALE_HEIGHT
 from microscale.ops.jpegtran import JpegtranError
-from microscale.ops.scale import add_scale, calculate_scale_length, lens_label, make_temp_scale
+from microscale.ops.scale import (
+    add_scale,
+    calculate_scale_length,
+    lens_label,
+    make_temp_scale,
+    replace_scale,
+)
 
 STEM = "2555v1_vi_s_N4_25112210990_39_"
 
@@ -91,3 +97,57 @@ def test_add_scale_fails_on_subsampling(mock_run: Any) -> None:
             add_scale(fp_in, fp_out)
 
         assert not fp_out.exists()
+
+
+@patch("microscale.ops.scale.run_jpegtran")
+def test_replace_scale_drops_over_old_bar(mock_run: Any) -> None:
+    """replace_scale drops the new bar at the old bar's row in one jpegtran call."""
+    width, height = 4656, 4048
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp = Path(tmpdir)
+        fp_in = tmp / f"{STEM}.jpg"
+        fp_out = tmp / f"{STEM}.jpg"
+
+        Image.new("RGB", (width, height), (0, 0, 0)).save(fp_in, subsampling=1)
+
+        result = replace_scale(fp_in, fp_out)
+
+        assert result == fp_out
+        mock_run.assert_called_once()
+        args: list[str] = mock_run.call_args[0][0]
+        assert args[args.index("-drop") + 1] == f"+0+{height - SCALE_HEIGHT}"
+        assert args[args.index("-copy") + 1] == "all"
+        assert sorted(p.name for p in tmp.iterdir()) == [f"{STEM}.jpg"]
+
+
+@patch("microscale.ops.scale.run_jpegtran")
+def test_replace_scale_keeps_source_on_failure(mock_run: Any) -> None:
+    mock_run.side_effect = JpegtranError("bad drop position")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp = Path(tmpdir)
+        fp_in = tmp / f"{STEM}.jpg"
+        Image.new("RGB", (800, 200), (0, 0, 0)).save(fp_in, subsampling=1)
+        data = fp_in.read_bytes()
+
+        with pytest.raises(JpegtranError):
+            replace_scale(fp_in, fp_in)
+
+        assert fp_in.read_bytes() == data
+        assert sorted(p.name for p in tmp.iterdir()) == [f"{STEM}.jpg"]
+
+
+@patch("microscale.ops.scale.run_jpegtran")
+def test_replace_scale_rejects_unscaled_file(mock_run: Any) -> None:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp = Path(tmpdir)
+        fp_in = tmp / f"{STEM[:-1]}#.jpg"
+        fp_out = tmp / f"{STEM}.jpg"
+        Image.new("RGB", (800, 200), (0, 0, 0)).save(fp_in, subsampling=1)
+
+        with pytest.raises(ValueError):
+            replace_scale(fp_in, fp_out)
+
+        mock_run.assert_not_called()
+        assert not fp_out.exists()
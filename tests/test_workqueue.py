@@ -0,0 +1,279 @@
+# tests/test_workqueue.py
+from __future__ import annotations
+
+import os
+import time
+from pathlib import Path
+from typing import Any
+from unittest.mock import patch
+
+import pytest
+
+from microscale.model import Job, Ops
+from microscale.workqueue import WorkQueue, _publish, merge_results, process_claimed, run_queue
+
+
+def make_file(tmp_path: Path, name: str = "a.jpg") -> Path:
+    fp = tmp_path / "batch" / name
+    fp.parent.mkdir(exist_ok=True)
+    fp.write_bytes(b"fake")
+    return fp
+
+
+def make_job(tmp_path: Path, name: str = "a.jpg") -> Job:
+    return Job(make_file(tmp_path, name), Ops())
+
+
+def test_claim_is_exclusive(tmp_path: Path) -> None:
+    job = make_job(tmp_path)
+    a = WorkQueue(tmp_path / "q", node="a")
+    b = WorkQueue(tmp_path / "q", node="b")
+
+    assert a.try_claim(job)
+    assert not b.try_claim(job)
+
+
+def test_done_file_is_not_reclaimed(tmp_path: Path) -> None:
+    job = make_job(tmp_path)
+    a = WorkQueue(tmp_path / "q", node="a")
+    b = WorkQueue(tmp_path / "q", node="b")
+
+    assert a.try_claim(job)
+    a.complete(job, {"status": "ok"})
+
+    assert a.is_done(job)
+    assert not b.try_claim(job)
+
+
+def test_stale_claim_is_reclaimed(tmp_path: Path) -> None:
+    job = make_job(tmp_path)
+    a = WorkQueue(tmp_path / "q", node="a")
+    b = WorkQueue(tmp_path / "q", node="b", lease_timeout=10)
+
+    assert a.try_claim(job)
+    claim = tmp_path / "q" / "claims" / a.key(job)
+    old = time.time() - 60
+    os.utime(claim, (old, old))
+
+    assert b.try_claim(job)
+    assert not list((tmp_path / "q" / "claims").glob("*.stale.*"))
+
+
+def test_key_ignores_mount_point(tmp_path: Path) -> None:
+    a = WorkQueue(tmp_path / "q", share_root=Path("/mnt/x"))
+    b = WorkQueue(tmp_path / "q", share_root=Path("/media/y"))
+    assert a.key(Job(Path("/mnt/x/batch/a.jpg"), Ops())) == b.key(
+        Job(Path("/media/y/batch/a.jpg"), Ops())
+    )
+
+
+def test_key_includes_ops(tmp_path: Path) -> None:
+    q = WorkQueue(tmp_path / "q")
+    fp = tmp_path / "batch" / "a.jpg"
+    assert q.key(Job(fp, Ops())) != q.key(Job(fp, Ops(rotate=True)))
+
+
+def test_key_outside_share_root(tmp_path: Path) -> None:
+    q = WorkQueue(tmp_path / "q")
+    with pytest.raises(ValueError):
+        q.key(Job(Path("/elsewhere/a.jpg"), Ops()))
+
+
+@patch("microscale.workqueue.process_image")
+def test_same_name_in_different_dirs(mock_process: Any, tmp_path: Path) -> None:
+    """Files sharing parent and file name in different subtrees are both processed."""
+    first = tmp_path / "2024" / "A" / "img.jpg"
+    second = tmp_path / "2025" / "A" / "img.jpg"
+    for fp in (first, second):
+        fp.parent.mkdir(parents=True)
+        fp.write_bytes(b"fake")
+    mock_process.side_effect = lambda fp, ops, size: fp
+    q = WorkQueue(tmp_path / "q", node="a")
+
+    assert q.key(Job(first, Ops())) != q.key(Job(second, Ops()))
+    run_queue(q, [first, second], Ops())
+
+    assert mock_process.call_count == 2
+
+
+@patch("microscale.workqueue.process_image")
+def test_process_claimed_records_errors(mock_process: Any, tmp_path: Path) -> None:
+    """Failures are logged but not marked done, so a later run retries them."""
+    fp = make_file(tmp_path)
+    q = WorkQueue(tmp_path / "q", node="a")
+    mock_process.side_effect = ValueError("bad lens")
+
+    record = process_claimed(fp, Ops(), q)
+
+    assert record is not None
+    assert record["status"] == "error"
+    assert not q.is_done(Job(fp, Ops()))
+    assert not list((tmp_path / "q" / "claims").iterdir())
+
+    mock_process.side_effect = lambda fp, ops, size: fp
+    record = process_claimed(fp, Ops(), q)
+    assert record is not None
+    assert record["status"] == "ok"
+
+
+@patch("microscale.workqueue.process_image")
+def test_run_queue_gives_up_on_failures(mock_process: Any, tmp_path: Path) -> None:
+    fp = make_file(tmp_path)
+    mock_process.side_effect = ValueError("bad lens")
+
+    records = run_queue(WorkQueue(tmp_path / "q", node="a"), [fp], Ops())
+
+    assert [r["status"] for r in records] == ["error"]
+
+
+@patch("microscale.workqueue.process_image")
+def test_other_ops_are_processed_again(mock_process: Any, tmp_path: Path) -> None:
+    fp = make_file(tmp_path)
+    mock_process.side_effect = lambda fp, ops, size: fp
+    q = WorkQueue(tmp_path / "q", node="a")
+
+    run_queue(q, [fp], Ops())
+    records = run_queue(q, [fp], Ops(rotate=True))
+
+    assert [r["status"] for r in records] == ["ok"]
+    assert mock_process.call_count == 2
+
+
+@patch("microscale.workqueue.process_image")
+def test_run_queue_merges_node_logs(mock_process: Any, tmp_path: Path) -> None:
+    files = [make_file(tmp_path, f"{i}.jpg") for i in range(4)]
+    mock_process.side_effect = lambda fp, ops, size: fp
+    a = WorkQueue(tmp_path / "q", node="a")
+    b = WorkQueue(tmp_path / "q", node="b")
+
+    run_queue(a, files[:2], Ops())
+    run_queue(b, files, Ops())
+
+    records = merge_results(tmp_path / "q")
+    assert sorted(r["file"] for r in records) == sorted(str(fp) for fp in files)
+    assert {r["node"] for r in records} == {"a", "b"}
+    assert mock_process.call_count == 4
+
+
+def steal_claim(q: WorkQueue, job: Job, node: str = "c") -> None:
+    """Replace the claim on job by one of another node."""
+    (q.root / "claims" / q.key(job)).write_text(f'{{"node": "{node}", "pid": 1, "time": 0}}')
+
+
+def test_complete_leaves_foreign_claim(tmp_path: Path) -> None:
+    job = make_job(tmp_path)
+    a = WorkQueue(tmp_path / "q", node="a")
+
+    assert a.try_claim(job)
+    steal_claim(a, job)
+
+    assert not a.owns(job)
+    assert not a.complete(job, {"status": "ok"})
+    assert not a.is_done(job)
+    assert (tmp_path / "q" / "claims" / a.key(job)).exists()
+
+
+def test_reclaim_does_not_restore_live_claim(tmp_path: Path) -> None:
+    """A live claim moved by mistake is not linked back; its holder gives up instead."""
+    job = make_job(tmp_path)
+    a = WorkQueue(tmp_path / "q", node="a")
+    b = WorkQueue(tmp_path / "q", node="b", lease_timeout=10)
+    c = WorkQueue(tmp_path / "q", node="c")
+
+    assert a.try_claim(job)
+    claim = tmp_path / "q" / "claims" / a.key(job)
+    old = time.time() - 60
+    os.utime(claim, (old, old))
+
+    rename = Path.rename
+
+    def c_reclaims_first(self: Path, target: Any) -> Path:
+        if self == claim:
+            steal_claim(c, job)  # c reclaimed and claimed between b's stat and rename
+        return rename(self, target)
+
+    with patch.object(Path, "rename", c_reclaims_first):
+        assert b.try_claim(job)
+
+    assert b.owns(job)
+    assert not c.owns(job)
+    assert not list((tmp_path / "q" / "claims").glob("*.stale.*"))
+
+
+@patch("microscale.workqueue.process_image")
+def test_process_claimed_drops_lost_claim(mock_process: Any, tmp_path: Path) -> None:
+    fp = make_file(tmp_path)
+    q = WorkQueue(tmp_path / "q", node="a")
+
+    def rotate_and_lose(staged: Path, ops: Ops, size: Any) -> Path:
+        staged.write_bytes(staged.read_bytes() + b"R")
+        steal_claim(q, Job(fp, ops))
+        return staged
+
+    mock_process.side_effect = rotate_and_lose
+
+    assert process_claimed(fp, Ops(), q) is None
+    assert not q.is_done(Job(fp, Ops()))
+    assert (tmp_path / "q" / "claims" / q.key(Job(fp, Ops()))).exists()
+    assert fp.read_bytes() == b"fake"  # nothing published
+
+
+class Crash(BaseException):
+    """A node dying mid-run: not caught by process_claimed."""
+
+
+def fake_rotate(fp: Path, ops: Ops, size: Any) -> Path:
+    fp.write_bytes(fp.read_bytes() + b"R")
+    return fp
+
+
+def expire_claims(q: WorkQueue) -> None:
+    old = time.time() - 60
+    for claim in (q.root / "claims").iterdir():
+        os.utime(claim, (old, old))
+
+
+@patch("microscale.workqueue.process_image")
+def test_reclaim_after_crash_processes_once(mock_process: Any, tmp_path: Path) -> None:
+    """A node dying before publishing leaves the source intact for the next holder."""
+    fp = make_file(tmp_path)
+    a = WorkQueue(tmp_path / "q", node="a")
+    b = WorkQueue(tmp_path / "q", node="b", lease_timeout=10)
+
+    def rotate_and_crash(fp: Path, ops: Ops, size: Any) -> Path:
+        fake_rotate(fp, ops, size)
+        raise Crash
+
+    mock_process.side_effect = rotate_and_crash
+    with pytest.raises(Crash):
+        process_claimed(fp, Ops(rotate=True), a)
+    assert fp.read_bytes() == b"fake"
+
+    expire_claims(a)
+    mock_process.side_effect = fake_rotate
+    record = process_claimed(fp, Ops(rotate=True), b)
+
+    assert record is not None
+    assert record["output"] == str(fp)
+    assert fp.read_bytes() == b"fakeR"
+    assert sorted(p.name for p in fp.parent.iterdir()) == ["a.jpg"]
+
+
+@patch("microscale.workqueue._publish", side_effect=Crash)
+@patch("microscale.workqueue.process_image", side_effect=fake_rotate)
+def test_reclaim_finishes_publish(mock_process: Any, mock_publish: Any, tmp_path: Path) -> None:
+    """A node dying while publishing is not processed again, only published."""
+    fp = make_file(tmp_path)
+    a = WorkQueue(tmp_path / "q", node="a")
+    b = WorkQueue(tmp_path / "q", node="b", lease_timeout=10)
+
+    with pytest.raises(Crash):
+        process_claimed(fp, Ops(rotate=True), a)
+
+    expire_claims(a)
+    mock_publish.side_effect = _publish  # the original, imported before patching
+    record = process_claimed(fp, Ops(rotate=True), b)
+
+    assert record is not None
+    assert mock_process.call_count == 1
+    assert fp.read_bytes() == b"fakeR"